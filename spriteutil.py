@@ -2,8 +2,76 @@
 import timeit
 import numpy as np
 import sys
-import random
-from PIL import Image, ImageDraw
+from PIL import Image
+
+try:
+    from scipy import ndimage
+except ImportError:
+    # fall back to the pure Python connected component labeling below
+    ndimage = None
+
+try:
+    import numba
+    from numba import prange
+except ImportError:
+    # keep the pure Python connected component labeling below
+    numba = None
+    prange = range
+
+
+def jit_kernel(function=None, parallel=False):
+    """
+    Compile function to machine code with Numba when it is installed.
+
+    The compiled code is cached in __pycache__, only the first run pays the compilation.
+    The GIL is released so kernels can run in threads, parallel=True also runs the
+    prange loops of the kernel on all cores.
+    """
+    if function is None:
+        return lambda function: jit_kernel(function, parallel=parallel)
+    if numba is None:
+        return function
+    return numba.njit(cache=True, nogil=True, boundscheck=False, parallel=parallel)(function)
+
+
+def read_pixels(image):
+    """
+    Return the pixels of an image as an array (height, width[, bands]).
+    """
+    # bilevel pixels as 0/255 integers, the same values as Image.getcolors
+    if image.mode == "1":
+        image = image.convert("L")
+    return np.asarray(image)
+
+
+def pack_pixels(img_arr):
+    """
+    Return a 2D array with one scalar per pixel, multi-band pixels are packed into an uint32.
+
+    @params:
+    1. img_arr: the pixels of an image, from read_pixels.
+
+    @return:
+    1. a 2D array (height, width), of uint32 if the image has 2 to 4 bands.
+    """
+    if img_arr.ndim == 2:
+        return img_arr
+
+    # pad the bands with zeros up to 4 bytes
+    channels = img_arr.shape[-1]
+    if channels < 4:
+        padding = np.zeros(img_arr.shape[:-1] + (4 - channels,), dtype=np.uint8)
+        img_arr = np.concatenate((img_arr, padding), axis=-1)
+    return np.ascontiguousarray(img_arr).view(np.uint32)[..., 0]
+
+
+def pack_color(color):
+    """
+    Return the color packed the same way as the pixels of pack_pixels.
+    """
+    if np.isscalar(color):
+        return color
+    return np.array(tuple(color) + (0,) * (4 - len(color)), dtype=np.uint8).view(np.uint32)[0]
 
 
 # WP1
@@ -19,12 +87,23 @@ def find_most_common_color(image):
     2. a tuple (red, green, blue) of integers (0 to 255) if the mode is RGB;
     3. a tuple (red, green, blue, alpha) of integers (0 to 255) if the mode is RGBA.
     """
-    try:
-        colors_list = image.getcolors(image.width * image.height) # unsorted list of (count, pixel) values
-        return max(colors_list, key=lambda tup:tup[0])[1]
-
-    except AttributeError:
+    if not isinstance(image, Image.Image):
         raise TypeError("Not an Image object!")
+    channels = len(image.getbands())
+
+    packed_arr = pack_pixels(read_pixels(image)).ravel()
+
+    # 8-bit grayscale or palette image: histogram of the 256 values
+    if packed_arr.dtype == np.uint8:
+        return int(np.bincount(packed_arr).argmax())
+
+    values, counts = np.unique(packed_arr, return_counts=True)
+    most_common = values[counts.argmax()]
+    if channels == 1:
+        return most_common.item()
+
+    # unpack the (red, green, blue[, alpha]) bytes
+    return tuple(np.array([most_common], dtype=np.uint32).view(np.uint8)[:channels].tolist())
 
 
 # WP2
@@ -33,6 +112,8 @@ class Sprite:
     Class Sprite which constructor takes 5 arguments label, x1, y1, x2, and y2.
     """
 
+    __slots__ = ('label', 'top_left', 'bottom_right', 'width', 'height')
+
     def __init__(self, label, x1, y1, x2, y2):
         """
         Initialize class Sprite's attributes.
@@ -56,164 +137,296 @@ class Sprite:
                 y2 >=0 and \
                 x1 <=x2 and \
                 y1 <=y2:
-                self.__label = label
-                self.__top_left = (x1, y1)
-                self.__bottom_right = (x2, y2)
-                self.__width = x2 - x1 + 1
-                self.__height = y2 - y1 + 1
+                self.label = label
+                self.top_left = (x1, y1)
+                self.bottom_right = (x2, y2)
+                self.width = x2 - x1 + 1
+                self.height = y2 - y1 + 1
             else:
                 raise ValueError("Invalid coordinates")
         except TypeError:
             raise ValueError("Invalid coordinates")
 
-    @property
-    def label(self):
-        """
-        Add the read-only property 'label' that returns the label of the sprite.
-        """
-        return self.__label
-    
-    @property
-    def top_left(self):
-        """
-        Add the read-only property 'top_left' that returns the coordinates of the top-left corner of the sprite.
-        """
-        return self.__top_left
-    
-    @property
-    def bottom_right(self):
-        """
-        Add the read-only property 'bottom_right' that returns the coordinates of the right-most corner of the sprite.
-        """
-        return self.__bottom_right
-    
-    @property
-    def width(self):
-        """
-        Add the read-only property 'width' that returns the number of pixels horizontally of the sprite.
-        """
-        return self.__width
-    
-    @property
-    def height(self):
-        """
-        Add the read-only property 'height' that returns the number of pixels vertically of the sprite.
-        """
-        return self.__height
-
 
-def check_neighborhood(pixel_coordinate, labelled_dict):
+def check_neighborhood(pixel_coordinate, label_grid):
     """
     Check nearest neighbors and return a list of equivalence for that pixel.
     @params:
     1. pixel_coordinate: coordinate of the pixel.
-    2. labelled_dict: dict containing label of each image pixels {label: [pixels]}.
+    2. label_grid: 2D int32 array of the temporary label of each image pixel, 0 if not labelled yet.
 
     @return:
-    1. a set of pixel's equivalence.
+    1. a list of pixel's equivalence, the labels of the labelled neighbors.
     """
     # check neighborhood to find exist label
-    equivalence = set()
-    directions = [(-1,-1), (0,-1), (1,-1), (-1,0), (1,0), (-1,1), (0,1), (1,1)]
-    for direction in directions:
-        neighbor = tuple(map(lambda x,y: x+y, pixel_coordinate, direction))
-        for label,list_pixels in labelled_dict.items():
+    equivalence = []
+    height, width = label_grid.shape
+    x, y = pixel_coordinate
+
+    # in row-major order only the NW, N, NE and W neighbors can be labelled already
+    for dx, dy in ((-1,-1), (0,-1), (1,-1), (-1,0)):
+        neighbor_x = x + dx
+        neighbor_y = y + dy
+        if 0 <= neighbor_x < width and 0 <= neighbor_y < height:
+            label = label_grid[neighbor_y, neighbor_x]
 
             # if neighbor has a label
-            if neighbor in list_pixels:
-                equivalence.add(label)
+            if label:
+                equivalence.append(int(label))
     return equivalence
 
 
-def find_label(pixel_coordinate, labelled_dict, equivalence_list):
+def find_label(pixel_coordinate, label_grid, parent, next_label):
     """
-    Return a label for the pixel and a list contain all pixels' equivalence (CCL Pass 1).
+    Return a label for the pixel and merge the labels of its equivalence (CCL Pass 1).
     @params:
     1. pixel coordinate: coordinate of the pixel (x,y).
-    2. labelled_dict: dict containing label of each image pixels {label: [pixels]}.
-    3. equivalence_list: list containing sets of all pixels' equivalence [set(equivalence)].
+    2. label_grid: 2D int32 array of the temporary label of each image pixel, 0 if not labelled yet.
+    3. parent: union-find int32 array, parent[label] is the parent label of label.
+    4. next_label: the label to give to the next new sprite.
 
     @return:
     1. label: temporary label for the pixel after first pass.
-    2. equivalence_list: list containing sets of all pixels' equivalence [set(equivalence)].
+    2. next_label: the label to give to the next new sprite.
     """
-    if not labelled_dict:
-        label = 1
+    # check label based on neighbors
+    equivalence = check_neighborhood(pixel_coordinate, label_grid)
+    if equivalence:
+        # print(equivalence)
+        label = min(equivalence)
+
+        # merge each (label, other_label) pair, skip the neighbors sharing the label
+        for other_label in equivalence:
+            if other_label != label:
+                union_labels(parent, label, other_label)
+
+    # if all neighbors have no label.
     else:
 
-        # check label based on neighbors
-        equivalence = check_neighborhood(pixel_coordinate, labelled_dict)
-        if equivalence:
-            # print(equivalence)
-            label = min(equivalence)
-            equivalence_list.append(equivalence)
-            
-        # if all neighbors have no label.
-        else:
+        # create new label when neighborhood have no label
+        label = next_label
+        parent[label] = label
+        next_label += 1
+    return label, next_label
 
-            # create new label when neighborhood have no label
-            label = max(labelled_dict.keys()) + 1
-    return label, equivalence_list
 
+def update_label(labels, parent):
+    """
+    Return the labels of the sprite pixels after merging equivalent labels (CCL Pass 2).
+    @params:
+    1. labels: 1D int32 array containing the temporary label of each sprite pixel.
+    2. parent: union-find int32 array, parent[label] is the parent label of label.
+
+    @return:
+    1. labels: 1D int32 array containing the reduced label of each sprite pixel.
+    """
+    max_label = int(labels.max()) if labels.size else 0
+
+    # lookup array from temporary label to root label, applied to all pixels at once
+    roots = np.zeros(max_label + 1, dtype=np.int32)
+    for label in range(1, max_label + 1):
+        roots[label] = find_root(parent, label)
+    return roots[labels]
 
-def update_label(labelled_dict, equivalence_list):
+
+def create_foreground_mask(image, background_color):
     """
-    Return a dictionary containing label for each pixels {label: [pixels]} (CCL Pass 2).
+    Return a 2D boolean array, True for each pixel that doesn't have the background color.
+
+    @params:
+    1. image: an image object.
+    2. background_color: the background color of the image.
+
+    @return:
+    1. mask: 2D boolean array of the same dimension (height, width) as the image.
     """
-    equivalence_dict = {}
-    for label in labelled_dict:
-        for sets in equivalence_list:
-            if label in sets:
-                if label in equivalence_dict:
-                    equivalence_dict[label].update(sets)
-                else:
-                    equivalence_dict[label] = sets
-    for key, value in equivalence_dict.items():
-        equivalence_dict[key] = min(value)
-    # print(equivalence_dict)
-    
-    for label in labelled_dict.copy():
-        reduced_label = equivalence_dict[label]
-        if reduced_label != label:
-            labelled_dict[reduced_label] += labelled_dict[label]
-            del labelled_dict[label]
-    return labelled_dict
+    # compare one scalar per pixel, all channels at once
+    return pack_pixels(read_pixels(image)) != pack_color(background_color)
 
 
-def create_labelled_dict(image, background_color):
+def create_labelled_pixels(image, background_color):
     """
+    Return coordinates and label of each sprite pixel as three parallel int32 arrays.
+    @params:
+    1. image: an image object.
+    2. background_color: the background color of the image.
+
+    @return:
+    1. xs, ys: 1D int32 arrays of the x and y coordinates of the sprite pixels.
+    2. labels: 1D int32 array of the label of the sprite pixels.
     """
-    labelled_dict = {}
-    equivalence_list = []
+    # label_grid is only used to look up the label of the neighbors
+    label_grid = np.zeros((image.height, image.width), dtype=np.int32)
+    labels = []
+    next_label = 1
 
-    # loop though image pixels (label pass 1)
-    for y in range(image.height):
-        for x in range(image.width):
-            pixel_color = image.getpixel((x, y))
+    # two 8-connected new labels can't share a 2x2 block
+    parent = np.zeros(((image.height + 1) // 2) * ((image.width + 1) // 2) + 1, dtype=np.int32)
 
-            # if pixel belong to a sprite
-            if pixel_color != background_color:
+    # pixels belonging to a sprite, in row-major order
+    mask = create_foreground_mask(image, background_color)
+    ys, xs = np.nonzero(mask)
 
-                # get pixel coordinate
-                pixel_coordinate = (x,y)
+    # loop though sprite pixels (label pass 1)
+    for x, y in zip(xs.tolist(), ys.tolist()):
 
-                # get pixel label
-                pixel_label, equivalence_list = find_label(pixel_coordinate, labelled_dict, equivalence_list)
+        # get pixel coordinate
+        pixel_coordinate = (x,y)
+
+        # get pixel label
+        pixel_label, next_label = find_label(pixel_coordinate, label_grid, parent, next_label)
+        label_grid[y, x] = pixel_label
+        labels.append(pixel_label)
 
-                # append coordinate to labelled_dict if pixel's label existed
-                if pixel_label in labelled_dict:
-                    labelled_dict[pixel_label].append(pixel_coordinate)
-                
-                # create new key in labelled_dict for new label
-                else:
-                    labelled_dict[pixel_label] = [pixel_coordinate]
-    
     # update label based on connected component label (pass 2)
-    labelled_dict = update_label(labelled_dict, equivalence_list)
-    return labelled_dict
+    labels = update_label(np.asarray(labels, dtype=np.int32), parent)
+    return xs.astype(np.int32), ys.astype(np.int32), labels
+
+
+def find_bounding_boxes(xs, ys, labels):
+    """
+    Return the labels and the (x1, y1, x2, y2) bounding box of each sprite.
+    @params:
+    1. xs, ys: 1D int32 arrays of the x and y coordinates of the sprite pixels.
+    2. labels: 1D int32 array of the label of the sprite pixels.
+
+    @return:
+    1. sprite_labels: 1D array of the distinct labels, sorted.
+    2. x1, y1, x2, y2: 1D arrays of the bounding box coordinates of each label.
+    """
+    if not labels.size:
+        return (np.empty(0, dtype=np.int32),) * 5
+
+    # group the pixels by label, then reduce each group
+    order = np.argsort(labels, kind="stable")
+    labels, xs, ys = labels[order], xs[order], ys[order]
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    return (labels[starts],
+            np.minimum.reduceat(xs, starts), np.minimum.reduceat(ys, starts),
+            np.maximum.reduceat(xs, starts), np.maximum.reduceat(ys, starts))
+
+
+@jit_kernel
+def find_root(parent, label):
+    """
+    Return the root label of a label in the union-find array, compressing the path on the way.
+    """
+    while parent[label] != label:
+        parent[label] = parent[parent[label]]
+        label = parent[label]
+    return label
+
+
+@jit_kernel
+def union_labels(parent, label, other_label):
+    """
+    Merge the sets of two labels, the smallest root becomes the root of both, and return it.
+    """
+    root = find_root(parent, label)
+    other_root = find_root(parent, other_label)
+    if other_root < root:
+        root, other_root = other_root, root
+    parent[other_root] = root
+    return root
+
+
+@jit_kernel(parallel=True)
+def ccl_two_pass(pixels, background_color, n_threads):
+    """
+    Return the label map of 8-connected sprite pixels, the number of labels and their bounding boxes (two-pass CCL).
+
+    The pixels are read once, by pass 1 which compares them to the background while labelling.
+    Pass 2 reads and rewrites label_map to relabel it and collects the bounding boxes on the way.
+
+    @params:
+    1. pixels: 3D array (height, width, channels) of the image pixels, channels compared one by one.
+    2. background_color: 1D array of the background color, one value per channel.
+    3. n_threads: the number of threads collecting the bounding boxes.
 
+    @return:
+    1. label_map: 2D int32 array, labels go from 1 to n_labels, 0 for the background.
+    2. n_labels: the number of connected components.
+    3. boxes: (n_labels + 1, 4) int32 array of (x1, y1, x2, y2) bounding boxes indexed by label.
+    """
+    height, width, channels = pixels.shape
+    label_map = np.zeros((height, width), dtype=np.int32)
+
+    # two 8-connected new labels can't share a 2x2 block
+    parent = np.zeros(((height + 1) // 2) * ((width + 1) // 2) + 1, dtype=np.int32)
+    next_label = 1
+
+    # pass 1: temporary labels, only the NW, N, NE and W neighbors are labelled yet
+    for y in range(height):
+        for x in range(width):
+            is_background = True
+            for channel in range(channels):
+                if pixels[y, x, channel] != background_color[channel]:
+                    is_background = False
+                    break
+            if is_background:
+                continue
+            label = 0
+            for neighbor_y, neighbor_x in ((y - 1, x - 1), (y - 1, x), (y - 1, x + 1), (y, x - 1)):
+                if neighbor_y >= 0 and 0 <= neighbor_x < width:
+                    neighbor_label = label_map[neighbor_y, neighbor_x]
+                    if neighbor_label != 0:
+                        if label == 0:
+                            label = neighbor_label
+                        elif neighbor_label != label:
+                            label = union_labels(parent, label, neighbor_label)
 
-def create_label_map(labelled_dict, image):
+            # create new label when neighborhood have no label
+            if label == 0:
+                label = next_label
+                parent[label] = label
+                next_label += 1
+            label_map[y, x] = label
+
+    # number roots from 1, a root is always smaller than the labels of its set
+    roots = np.zeros(next_label, dtype=np.int32)
+    n_labels = 0
+    for label in range(1, next_label):
+        root = find_root(parent, label)
+        if root == label:
+            n_labels += 1
+            roots[label] = n_labels
+        else:
+            roots[label] = roots[root]
+
+    # pass 2: replace temporary labels by their root, each thread accumulates the
+    # bounding boxes of its band of rows, or a single serial scan when the per-thread
+    # boxes would take more memory than the label map
+    n_bands = max(1, min(height, n_threads))
+    if n_bands * (n_labels + 1) * 4 > height * width:
+        n_bands = 1
+    band_boxes = np.empty((n_bands, n_labels + 1, 4), dtype=np.int32)
+    band_boxes[:, :, 0] = width
+    band_boxes[:, :, 1] = height
+    band_boxes[:, :, 2] = -1
+    band_boxes[:, :, 3] = -1
+    for band in prange(n_bands):
+        for y in range(band * height // n_bands, (band + 1) * height // n_bands):
+            for x in range(width):
+                label = roots[label_map[y, x]]
+                label_map[y, x] = label
+                if label != 0:
+                    band_boxes[band, label, 0] = min(band_boxes[band, label, 0], x)
+                    band_boxes[band, label, 1] = min(band_boxes[band, label, 1], y)
+                    band_boxes[band, label, 2] = max(band_boxes[band, label, 2], x)
+                    band_boxes[band, label, 3] = max(band_boxes[band, label, 3], y)
+
+    # reduce the boxes of all bands into the first one
+    boxes = band_boxes[0]
+    for band in range(1, n_bands):
+        for label in range(1, n_labels + 1):
+            boxes[label, 0] = min(boxes[label, 0], band_boxes[band, label, 0])
+            boxes[label, 1] = min(boxes[label, 1], band_boxes[band, label, 1])
+            boxes[label, 2] = max(boxes[label, 2], band_boxes[band, label, 2])
+            boxes[label, 3] = max(boxes[label, 3], band_boxes[band, label, 3])
+    return label_map, n_labels, boxes
+
+
+def create_label_map(xs, ys, labels, image):
     """
     Return A 2D array of integers of equal dimension (width and height) as the original
     image where the sprites are packed in. The label_map array maps each pixel of the image
@@ -221,22 +434,19 @@ def create_label_map(labelled_dict, image):
     pixel doesn't belong to a sprite (e.g., background color).
 
     @params:
+    1. xs, ys: 1D int32 arrays of the x and y coordinates of the sprite pixels.
+    2. labels: 1D int32 array of the label of the sprite pixels.
+    3. image: an image object.
 
     @return:
     label_map: 2D array of integers containing sprites as image. 
     """
-    label_map = []
-    for y in range(image.height):
-        horizontal_label_map = []
-        for x in range(image.width):
-            pixel_coordinate = (x,y)
-            pixel_label = 0
-            for label,list_pixels in labelled_dict.items():
-                if pixel_coordinate in list_pixels:
-                    pixel_label = label
-            horizontal_label_map.append(pixel_label)
-        label_map.append(horizontal_label_map)
-    label_map = np.array(label_map)
+    # smallest unsigned integer type holding the labels (uint8 up to 255 labels)
+    max_label = int(labels.max()) if labels.size else 0
+    label_map = np.zeros((image.height, image.width), dtype=np.min_scalar_type(max_label))
+
+    # scatter the labels to all (x,y) coordinates at once
+    label_map[ys, xs] = labels
     return label_map
 
 
@@ -246,59 +456,104 @@ def find_sprites(image, background_color=None):
     """
     if background_color is None:
         background_color = find_most_common_color(image)
-    labelled_dict = create_labelled_dict(image, background_color)
+
+    if ndimage is not None:
+        # label 8-connected foreground pixels (C-level two-pass CCL)
+        mask = create_foreground_mask(image, background_color)
+        label_map, n_labels = ndimage.label(mask, structure=np.ones((3,3), dtype=np.int8))
+        label_map = label_map.astype(np.min_scalar_type(n_labels), copy=False)
+
+        # print total sprites
+        print(n_labels)
+
+        # list of sprites, bounding box slices are indexed by label - 1
+        sprites = {}
+        for label, (y_slice, x_slice) in enumerate(ndimage.find_objects(label_map), start=1):
+            sprite = Sprite(label, x_slice.start, y_slice.start, x_slice.stop - 1, y_slice.stop - 1)
+            sprites[label] = sprite
+        return sprites, label_map
+
+    if numba is not None:
+        # label 8-connected sprite pixels with the compiled union-find kernel
+        img_arr = read_pixels(image)
+        if img_arr.ndim == 3 and img_arr.shape[-1] < 4:
+            # compare the bands in the kernel rather than padding a packed copy
+            pixels = img_arr
+            background = np.array(background_color, dtype=img_arr.dtype)
+        else:
+            pixels = pack_pixels(img_arr)[..., np.newaxis]
+            background = np.array([pack_color(background_color)], dtype=pixels.dtype)
+        label_map, n_labels, boxes = ccl_two_pass(pixels, background, numba.get_num_threads())
+        label_map = label_map.astype(np.min_scalar_type(n_labels), copy=False)
+
+        # print total sprites
+        print(n_labels)
+
+        # list of sprites
+        sprites = {}
+        for label in range(1, n_labels + 1):
+            x1, y1, x2, y2 = boxes[label].tolist()
+            sprite = Sprite(label, x1, y1, x2, y2)
+            sprites[label] = sprite
+        return sprites, label_map
+
+    xs, ys, labels = create_labelled_pixels(image, background_color)
+    sprite_labels, x1s, y1s, x2s, y2s = find_bounding_boxes(xs, ys, labels)
 
     # print total sprites
-    print(len(labelled_dict))
+    print(len(sprite_labels))
 
     # list of sprites
     sprites = {}
-    for label in labelled_dict:
-        x1 = min(labelled_dict[label], key=lambda x: x[0])[0]
-        x2 = max(labelled_dict[label], key=lambda x: x[0])[0]
-        y1 = min(labelled_dict[label], key=lambda x: x[1])[1]
-        y2 = max(labelled_dict[label], key=lambda x: x[1])[1]
+    for label, x1, y1, x2, y2 in zip(sprite_labels.tolist(), x1s.tolist(), y1s.tolist(), x2s.tolist(), y2s.tolist()):
         sprite = Sprite(label, x1, y1, x2, y2)
         sprites[label] = sprite
     
     # label_map
-    label_map = create_label_map(labelled_dict, image)
+    label_map = create_label_map(xs, ys, labels, image)
 
     return sprites, label_map
 
 
 # WP4
-def create_sprite_labels_image(sprites, label_map, background_color=(255, 255, 255)):
+def create_sprite_labels_image(sprites, label_map, background_color=(255, 255, 255), seed=None):
     """
+    Return an RGBA image of the sprites, each label in a random color, with their bounding boxes.
+
+    @params:
+    1. sprites: dict of the sprites {label: sprite}.
+    2. label_map: 2D array of the label of each pixel, 0 for the background.
+    3. background_color: (red, green, blue[, alpha]) color of the background.
+    4. seed: seed of the random colors, the same seed gives the same colors.
+
+    @return:
+    1. img: an image object.
     """
-    width = len(label_map[0])
-    height = len(label_map)
     a = 255
     if len(background_color) == 3:
         background_color += (a,)
-    label_color = {}
-    empty_arr = np.zeros((height,width,4), dtype=np.uint8)
-    for (x,y), label in np.ndenumerate(label_map):
-        if label == 0:
-            empty_arr[x][y] = background_color
-        else:
-            if label not in label_color:
-                r,g,b = random.sample(range(0, 255), 3)
-                random_color = (r,g,b,a)
-                label_color[label] = random_color
-            empty_arr[x][y] = label_color[label]
-    img = Image.fromarray(empty_arr)
 
-    draw = ImageDraw.Draw(img)
+    # palette[label] is the color of the label, 0 for the background
+    max_label = int(np.max(label_map, initial=0))
+    palette = np.empty((max_label + 1, 4), dtype=np.uint8)
+    palette[0] = background_color
+    rng = np.random.default_rng(seed)
+    palette[1:, :3] = rng.integers(0, 256, size=(max_label, 3), dtype=np.uint8)
+    palette[1:, 3] = a
+
+    # color all pixels at once
+    empty_arr = palette[label_map]
+
+    # draw the bounding box of each sprite straight into the array
     for label, sprite in sprites.items():
-        top_left = sprite.top_left
-        bottom_right = sprite.bottom_right
-        top_right = tuple(map(lambda x,y: x+y, top_left, (sprite.width-1, 0)))
-        bottom_left =  tuple(map(lambda x,y: x+y, top_left, (0, sprite.height-1)))
-        draw.line([top_left,top_right], fill=label_color[label])
-        draw.line([top_left,bottom_left], fill=label_color[label])
-        draw.line([bottom_right,top_right], fill=label_color[label])
-        draw.line([bottom_right,bottom_left], fill=label_color[label])
+        label_color = palette[label]
+        x1, y1 = sprite.top_left
+        x2, y2 = sprite.bottom_right
+        empty_arr[y1, x1:x2+1] = label_color
+        empty_arr[y2, x1:x2+1] = label_color
+        empty_arr[y1:y2+1, x1] = label_color
+        empty_arr[y1:y2+1, x2] = label_color
+    img = Image.fromarray(empty_arr)
     return img
 
 